@@ -1,23 +1,82 @@
+import asyncio
 import os
 import json
-from typing import Dict, Any, Optional
+import re
+import sys
+import threading
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup; fall back to the stdlib
+    orjson = None
+
+
+def _json_loads(raw: bytes) -> Any:
+    """Parses JSON bytes, using orjson when it is available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps(obj: Any, indent: bool = True) -> bytes:
+    """Serializes an object to JSON bytes, using orjson when it is available."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers wider than 64 bits, which the stdlib still handles
+    if indent:
+        return json.dumps(obj, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# Defaults for settings not provided by the environment, interned once at import
+_DEFAULT_HOST = sys.intern("0.0.0.0")
+_DEFAULT_LOG_LEVEL = sys.intern("INFO")
+_DEFAULT_OPENAI_BASE_URL = sys.intern("https://api.openai.com/v1")
+_DEFAULT_BIG_MODEL = sys.intern("gpt-4o")
+_DEFAULT_SMALL_MODEL = sys.intern("gpt-4o-mini")
+
+# Allowed profile names: letters, digits, '_' and '-', at most 64 characters
+_NAME_RE = re.compile(r"[\w\-]{1,64}")
+
 
 class Config:
     """Holds the application configuration."""
+
+    # (profile key, attribute name, caster) for every setting stored in a profile.
+    # A caster of None stores the value as is.
+    _FIELDS = (
+        ("OPENAI_API_KEY", "openai_api_key", None),
+        ("ANTHROPIC_API_KEY", "anthropic_api_key", None),
+        ("OPENAI_BASE_URL", "openai_base_url", None),
+        ("AZURE_API_VERSION", "azure_api_version", None),
+        ("BIG_MODEL", "big_model", None),
+        ("MIDDLE_MODEL", "middle_model", None),
+        ("SMALL_MODEL", "small_model", None),
+        ("MAX_TOKENS_LIMIT", "max_tokens_limit", int),
+        ("MIN_TOKENS_LIMIT", "min_tokens_limit", int),
+        ("REQUEST_TIMEOUT", "request_timeout", int),
+        ("MAX_RETRIES", "max_retries", int),
+    )
+
+    __slots__ = ("host", "port", "log_level") + tuple(attr for _, attr, _ in _FIELDS)
+
     def __init__(self):
         # Load all settings from environment variables first as a base default
-        self.host: str = os.environ.get("HOST", "0.0.0.0")
+        self.host: str = os.environ.get("HOST", _DEFAULT_HOST)
         self.port: int = int(os.environ.get("PORT", 8082))
-        self.log_level: str = os.environ.get("LOG_LEVEL", "INFO")
+        self.log_level: str = os.environ.get("LOG_LEVEL", _DEFAULT_LOG_LEVEL)
         
         # Load dynamic settings from environment as the base layer
         self.openai_api_key = os.environ.get("OPENAI_API_KEY")
         self.anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
-        self.openai_base_url = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        self.openai_base_url = os.environ.get("OPENAI_BASE_URL", _DEFAULT_OPENAI_BASE_URL)
         self.azure_api_version = os.environ.get("AZURE_API_VERSION")
-        self.big_model = os.environ.get("BIG_MODEL", "gpt-4o")
+        self.big_model = os.environ.get("BIG_MODEL", _DEFAULT_BIG_MODEL)
         self.middle_model = os.environ.get("MIDDLE_MODEL", self.big_model)
-        self.small_model = os.environ.get("SMALL_MODEL", "gpt-4o-mini")
+        self.small_model = os.environ.get("SMALL_MODEL", _DEFAULT_SMALL_MODEL)
         self.max_tokens_limit = int(os.environ.get("MAX_TOKENS_LIMIT", 4096))
         self.min_tokens_limit = int(os.environ.get("MIN_TOKENS_LIMIT", 100))
         self.request_timeout = int(os.environ.get("REQUEST_TIMEOUT", 90))
@@ -28,33 +87,22 @@ class Config:
         Updates the configuration from a dictionary (a profile).
         It only updates if a key is present in the dictionary.
         """
-        if "OPENAI_API_KEY" in data: self.openai_api_key = data["OPENAI_API_KEY"]
-        if "ANTHROPIC_API_KEY" in data: self.anthropic_api_key = data["ANTHROPIC_API_KEY"]
-        if "OPENAI_BASE_URL" in data: self.openai_base_url = data["OPENAI_BASE_URL"]
-        if "AZURE_API_VERSION" in data: self.azure_api_version = data["AZURE_API_VERSION"]
-        if "BIG_MODEL" in data: self.big_model = data["BIG_MODEL"]
-        if "MIDDLE_MODEL" in data: self.middle_model = data.get("BIG_MODEL") # Fallback
-        if "SMALL_MODEL" in data: self.small_model = data["SMALL_MODEL"]
-        if "MAX_TOKENS_LIMIT" in data: self.max_tokens_limit = int(data["MAX_TOKENS_LIMIT"])
-        if "MIN_TOKENS_LIMIT" in data: self.min_tokens_limit = int(data["MIN_TOKENS_LIMIT"])
-        if "REQUEST_TIMEOUT" in data: self.request_timeout = int(data["REQUEST_TIMEOUT"])
-        if "MAX_RETRIES" in data: self.max_retries = int(data["MAX_RETRIES"])
+        for _, attr, value in self._coerce(data):
+            setattr(self, attr, value)
+
+    @classmethod
+    def _coerce(cls, data: Dict[str, Any]) -> Iterator[Tuple[str, str, Any]]:
+        """Yields (key, attribute, value) for each setting present in a profile dict."""
+        for key, attr, caster in cls._FIELDS:
+            if key in data:
+                value = data[key]
+                if key == "MIDDLE_MODEL":
+                    value = data.get("BIG_MODEL")  # Fallback
+                yield key, attr, value if caster is None else caster(value)
 
     def to_dict(self) -> Dict[str, Any]:
         """Serializes the dynamic parts of the config to a dictionary."""
-        return {
-            "OPENAI_API_KEY": self.openai_api_key,
-            "ANTHROPIC_API_KEY": self.anthropic_api_key,
-            "OPENAI_BASE_URL": self.openai_base_url,
-            "AZURE_API_VERSION": self.azure_api_version,
-            "BIG_MODEL": self.big_model,
-            "MIDDLE_MODEL": self.middle_model,
-            "SMALL_MODEL": self.small_model,
-            "MAX_TOKENS_LIMIT": self.max_tokens_limit,
-            "MIN_TOKENS_LIMIT": self.min_tokens_limit,
-            "REQUEST_TIMEOUT": self.request_timeout,
-            "MAX_RETRIES": self.max_retries,
-        }
+        return {key: getattr(self, attr) for key, attr, _ in self._FIELDS}
 
     def validate_client_api_key(self, client_api_key: str) -> bool:
         """Validate client's Anthropic API key."""
@@ -63,104 +111,244 @@ class Config:
         return client_api_key == self.anthropic_api_key
 
 
+# Profile values taken from the environment, computed once at import
+_BASE_DEFAULTS: Dict[str, Any] = Config().to_dict()
+
+
+def _normalize_profile(profile_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns a complete profile: the environment defaults overlaid with profile_data."""
+    profile = dict(_BASE_DEFAULTS)
+    profile.update((key, value) for key, _, value in Config._coerce(profile_data))
+    return profile
+
+
 class ConfigManager:
     """Manages loading, saving, and switching configuration profiles."""
     def __init__(self, config_dir: str = "configs"):
         self.config_dir = config_dir
         self.profiles_path = os.path.join(self.config_dir, "profiles.json")
         self.data: Dict[str, Any] = {"active_profile": "default", "profiles": {}}
+        # Mirrors self.data["active_profile"]; set wherever self.data is replaced
+        self._active = "default"
+        # (st_mtime_ns, st_size) of profiles.json as last read or written by us
+        self._cached_stat: Optional[Tuple[int, int]] = None
+        # Serializes mutations, which the web routes run in worker threads
+        self._lock = threading.RLock()
+        # Incremented whenever the profiles or the active config change
+        self.revision = 0
+        # Compact JSON of each profile served by the API; replaced (not cleared) on every change
+        self._serialized_cache: Dict[str, bytes] = {}
         self.config = Config()  # Initialize the single config object
-        self._ensure_config_exists()
-        self.load_config()
+        # profiles.json is read lazily (see ensure_loaded); until then config holds env values
+        self._loaded = False
+
+    async def ensure_loaded(self):
+        """Loads the profiles in a worker thread if they have not been loaded yet."""
+        if not self._loaded:
+            await asyncio.to_thread(self._load_once)
+
+    def _load_once(self):
+        """Creates profiles.json if needed and applies the active profile, once."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._ensure_config_exists()
+            self.load_config()
+            self._loaded = True
 
     def _ensure_config_exists(self):
         """Ensures the config directory and default profiles.json exist."""
         os.makedirs(self.config_dir, exist_ok=True)
         if not os.path.exists(self.profiles_path):
             # Create a default profile from the current environment variables.
-            # A temporary Config object will be initialized with all values from the env.
-            temp_config = Config()
-            self.data["profiles"]["default"] = temp_config.to_dict()
-            self.save_profiles()
+            self.save_profiles(
+                {"active_profile": "default", "profiles": {"default": dict(_BASE_DEFAULTS)}}
+            )
 
     def load_config(self):
         """
         Loads the active profile, layering it on top of the base config from env vars.
         """
-        # The self.config object is already initialized with env vars.
-        # Now, we load the JSON profiles and apply the active one on top.
-        with open(self.profiles_path, "r") as f:
-            self.data = json.load(f)
-        
-        active_profile_name = self.data.get("active_profile", "default")
-        profile_data = self.data["profiles"].get(active_profile_name, {})
-        
-        # Layer the profile data on top of the base config
-        self.config.update(profile_data)
-        
-        print(f"✅ Configuration updated for profile: '{active_profile_name}'")
+        with self._lock:
+            # The self.config object is already initialized with env vars.
+            # Now, we load the JSON profiles and apply the active one on top.
+            # The file is only re-parsed if it changed since we last read or wrote it.
+            st = os.stat(self.profiles_path)
+            file_stat = (st.st_mtime_ns, st.st_size)
+            if file_stat != self._cached_stat:
+                with open(self.profiles_path, "rb") as f:
+                    self.data = _json_loads(f.read())
+                self._cached_stat = file_stat
+                self._serialized_cache = {}
 
-    def save_profiles(self):
-        """Saves the current state of profiles to the JSON file."""
-        with open(self.profiles_path, "w") as f:
-            json.dump(self.data, f, indent=2)
+            self._active = active_profile_name = self.data.get("active_profile", "default")
+            profile_data = self.data["profiles"].get(active_profile_name, {})
+
+            # Layer the profile data on top of the base config
+            self.config.update(profile_data)
+            self.revision += 1
+
+            print(f"✅ Configuration updated for profile: '{active_profile_name}'")
+
+    def save_profiles(self, data: Optional[Dict[str, Any]] = None):
+        """
+        Saves the profiles to the JSON file; `data` (default: the current state) only
+        replaces self.data once it has been written, so a failed save changes nothing.
+        """
+        if data is None:
+            data = self.data
+        payload = _json_dumps(data)
+        # Write to a temporary file and swap it in, so a crash never leaves a partial file.
+        # The name is per process because several workers may share the config dir;
+        # threads within one process are serialized by self._lock.
+        tmp_path = f"{self.profiles_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.profiles_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self.data = data
+        self._active = data.get("active_profile", "default")
+        self.revision += 1
+        self._serialized_cache = {}
+        # self.data is what is on disk now, so a following load_config can skip the parse.
+        st = os.stat(self.profiles_path)
+        self._cached_stat = (st.st_mtime_ns, st.st_size)
 
     def get_active_profile_name(self) -> str:
-        return self.data.get("active_profile", "default")
+        return self._active
+
+    def get_profile_names(self) -> List[str]:
+        return list(self.data.get("profiles", {}))
 
-    def get_all_profiles(self) -> Dict[str, Any]:
-        return self.data.get("profiles", {})
+    def get_profile_json(self, name: str) -> Optional[bytes]:
+        """Returns a profile serialized as JSON, or None if it does not exist or is empty."""
+        # Hold on to the current cache so a concurrent save cannot leave stale bytes behind
+        cache = self._serialized_cache
+        serialized = cache.get(name)
+        if serialized is None:
+            profile_data = self.data.get("profiles", {}).get(name)
+            if not profile_data:
+                return None
+            serialized = cache[name] = _json_dumps(profile_data, indent=False)
+        return serialized
+
+    @staticmethod
+    def _validate_name(name: str):
+        """Raises ValueError unless name is a valid name for a new profile."""
+        if not _NAME_RE.fullmatch(name):
+            raise ValueError(
+                f"Invalid profile name '{name}': use 1-64 letters, digits, '_' or '-'."
+            )
 
     def save_profile(self, name: str, profile_data: Dict[str, Any]):
         """Saves a profile and reloads the config if it's the active one."""
-        # Ensure all fields are present by doing a round-trip with the Config object
-        temp_config = Config()
-        temp_config.update(profile_data)
-        self.data["profiles"][name] = temp_config.to_dict()
-        
-        self.save_profiles()
-        if name == self.get_active_profile_name():
-            self.load_config()
+        with self._lock:
+            self._load_once()
+            if name not in self.data["profiles"]:
+                self._validate_name(name)
+            # Ensure all fields are present by filling in the environment defaults
+            profiles = dict(self.data["profiles"])
+            profiles[name] = _normalize_profile(profile_data)
+
+            self.save_profiles(dict(self.data, profiles=profiles))
+            if name == self._active:
+                self.load_config()
+
+    def create_profile(self, name: str):
+        """Creates a new profile with default values."""
+        with self._lock:
+            self._load_once()
+            self._validate_name(name)
+            if name in self.data["profiles"]:
+                raise ValueError(f"Profile '{name}' already exists.")
+            self.save_profile(name, {})
 
     def rename_profile(self, old_name: str, new_name: str):
         """Renames a profile."""
-        if old_name not in self.data["profiles"]:
-            raise ValueError(f"Profile '{old_name}' not found.")
-        if new_name in self.data["profiles"]:
-            raise ValueError(f"Profile '{new_name}' already exists.")
-        if not new_name.strip():
-            raise ValueError("New profile name cannot be empty.")
-        if old_name == "default":
-            raise ValueError("Cannot rename the default profile.")
-
-        # Rename the profile
-        self.data["profiles"][new_name] = self.data["profiles"].pop(old_name)
-
-        # If the renamed profile was active, update the active profile name
-        if self.data.get("active_profile") == old_name:
-            self.data["active_profile"] = new_name
-        
-        self.save_profiles()
+        with self._lock:
+            self._load_once()
+            if old_name not in self.data["profiles"]:
+                raise ValueError(f"Profile '{old_name}' not found.")
+            if new_name in self.data["profiles"]:
+                raise ValueError(f"Profile '{new_name}' already exists.")
+            self._validate_name(new_name)
+            if old_name == "default":
+                raise ValueError("Cannot rename the default profile.")
+
+            # Rename the profile
+            profiles = dict(self.data["profiles"])
+            profiles[new_name] = profiles.pop(old_name)
+            data = dict(self.data, profiles=profiles)
+
+            # If the renamed profile was active, update the active profile name
+            if self._active == old_name:
+                data["active_profile"] = new_name
+
+            self.save_profiles(data)
+
+    def update_profile(self, old_name: str, new_name: str, profile_data: Dict[str, Any]):
+        """
+        Saves a profile's data and renames it if the name changed, writing the file once.
+        The config is reloaded only if the profile is the active one.
+        """
+        with self._lock:
+            self._load_once()
+            if old_name not in self.data["profiles"]:
+                raise ValueError(f"Profile '{old_name}' not found.")
+            if old_name != new_name:
+                if new_name in self.data["profiles"]:
+                    raise ValueError(f"Profile '{new_name}' already exists.")
+                self._validate_name(new_name)
+                if old_name == "default":
+                    raise ValueError("Cannot rename the default profile.")
+            # Changes are made on a copy that save_profiles only adopts once written,
+            # so a coercion or write error leaves self.data unchanged.
+            profiles = dict(self.data["profiles"])
+            if old_name != new_name:
+                del profiles[old_name]
+            # Ensure all fields are present by filling in the environment defaults
+            profiles[new_name] = _normalize_profile(profile_data)
+            data = dict(self.data, profiles=profiles)
+
+            is_active = self._active == old_name
+            if is_active:
+                data["active_profile"] = new_name
+
+            self.save_profiles(data)
+            if is_active:
+                self.load_config()
 
     def activate_profile(self, name: str):
         """Sets a profile as active and reloads the configuration."""
-        if name not in self.data["profiles"]:
-            raise ValueError(f"Profile '{name}' not found.")
-        self.data["active_profile"] = name
-        self.save_profiles()
-        self.load_config()
+        with self._lock:
+            self._load_once()
+            if name not in self.data["profiles"]:
+                raise ValueError(f"Profile '{name}' not found.")
+            self.save_profiles(dict(self.data, active_profile=name))
+            self.load_config()
 
     def delete_profile(self, name: str):
         """Deletes a profile."""
-        if name not in self.data["profiles"]:
-            raise ValueError(f"Profile '{name}' not found.")
-        if name == "default":
-            raise ValueError("Cannot delete the default profile.")
-        if name == self.get_active_profile_name():
-            raise ValueError("Cannot delete the active profile. Switch to another profile first.")
-            
-        del self.data["profiles"][name]
-        self.save_profiles()
+        with self._lock:
+            self._load_once()
+            if name not in self.data["profiles"]:
+                raise ValueError(f"Profile '{name}' not found.")
+            if name == "default":
+                raise ValueError("Cannot delete the default profile.")
+            if name == self._active:
+                raise ValueError("Cannot delete the active profile. Switch to another profile first.")
+
+            profiles = dict(self.data["profiles"])
+            del profiles[name]
+            self.save_profiles(dict(self.data, profiles=profiles))
 
 # Global instance of the ConfigManager
 config_manager = ConfigManager()
@@ -1,13 +1,25 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from src.api.endpoints import router as api_router
 from src.web.routes import router as web_router
 import uvicorn
 from src.core.config import config, config_manager
 
-app = FastAPI(title="Claude-to-OpenAI API Proxy", version="1.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Profiles are loaded here rather than at import, so importing the app does no disk I/O.
+    # Startup waits for the load, so no request is served before the active profile applies.
+    await config_manager.ensure_loaded()
+    print_startup_message()
+    yield
+
+
+app = FastAPI(title="Claude-to-OpenAI API Proxy", version="1.1.0", lifespan=lifespan)
 
 # API Router
 app.include_router(api_router)
@@ -30,8 +42,6 @@ def print_startup_message():
 
 
 def main():
-    print_startup_message()
-
     # Parse log level
     log_level = config.log_level.lower()
     valid_levels = ['debug', 'info', 'warning', 'error', 'critical']
@@ -1,28 +1,59 @@
+import asyncio
+
 from fastapi import APIRouter, Request, Depends, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
-from typing import Dict, Any
+from pydantic import BaseModel, ValidationError
+from typing import Dict, Any, Optional, Tuple, Type, TypeVar
 
 from src.core.config import config_manager, Config
 
 router = APIRouter()
 templates = Jinja2Templates(directory="src/web/templates")
+# Templates do not change while the server runs, so skip Jinja's per-request mtime check
+templates.env.auto_reload = False
+
+# (config_manager.revision, rendered HTML) of the last configuration page served
+_root_page_cache: Optional[Tuple[int, str]] = None
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+async def _parse_body(request: Request, model: Type[ModelT]) -> ModelT:
+    """
+    Validates the raw JSON body against a model.
+    The config routes parse their bodies themselves rather than through FastAPI's
+    body injection; invalid bodies still get FastAPI's usual 422 response.
+    """
+    try:
+        return model.model_validate_json(await request.body())
+    except ValidationError as e:
+        # Prefix locations with "body" as FastAPI does for injected body models
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        )
 
 @router.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Serves the main configuration page."""
-    profiles = config_manager.get_all_profiles()
-    active_profile_name = config_manager.get_active_profile_name()
-    
-    return templates.TemplateResponse("index.html", {
-        "request": request,
-        "config": config_manager.config,
-        "profiles": profiles,
-        "active_profile_name": active_profile_name,
-        "config_manager": config_manager,  # Pass the manager to the template
-        "message": ""
-    })
+    global _root_page_cache
+    await config_manager.ensure_loaded()
+    # The page only depends on the config state, so re-render only when it has changed
+    revision = config_manager.revision
+    if _root_page_cache is None or _root_page_cache[0] != revision:
+        # The page only lists profile names; each profile's data is fetched on demand
+        profile_names = config_manager.get_profile_names()
+        active_profile_name = config_manager.get_active_profile_name()
+
+        html = templates.get_template("index.html").render({
+            "config": config_manager.config,
+            "profiles": profile_names,
+            "active_profile_name": active_profile_name,
+            "config_manager": config_manager,  # Pass the manager to the template
+            "message": ""
+        })
+        _root_page_cache = (revision, html)
+    return HTMLResponse(_root_page_cache[1])
 
 class ProfileUpdateData(BaseModel):
     original_name: str
@@ -30,34 +61,28 @@ class ProfileUpdateData(BaseModel):
     data: Dict[str, Any]
 
 @router.post("/api/config/update")
-async def update_config(profile: ProfileUpdateData):
+async def update_config(request: Request):
     """Updates an existing profile's data and optionally renames it."""
+    profile = await _parse_body(request, ProfileUpdateData)
     try:
-        # First, save the data to the original profile name
-        config_manager.save_profile(profile.original_name, profile.data)
+        await asyncio.to_thread(
+            config_manager.update_profile, profile.original_name, profile.new_name, profile.data
+        )
 
-        # If the name has changed, rename the profile
-        if profile.original_name != profile.new_name:
-            config_manager.rename_profile(profile.original_name, profile.new_name)
-        
         return {"status": "success", "message": f"Profile '{profile.new_name}' updated."}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-class NewProfileRequest(BaseModel):
+class ProfileNameRequest(BaseModel):
+    """Request body naming a single profile (new, activate and delete)."""
     profile_name: str
 
 @router.post("/api/config/new")
-async def new_config(req: NewProfileRequest):
+async def new_config(request: Request):
     """Creates a new, empty profile."""
+    req = await _parse_body(request, ProfileNameRequest)
     try:
-        if not req.profile_name.strip():
-            raise ValueError("Profile name cannot be empty.")
-        if req.profile_name in config_manager.get_all_profiles():
-            raise ValueError(f"Profile '{req.profile_name}' already exists.")
-            
-        # Create a new profile with default values
-        config_manager.save_profile(req.profile_name, {})
+        await asyncio.to_thread(config_manager.create_profile, req.profile_name)
         return {"status": "success", "message": f"Profile '{req.profile_name}' created."}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -65,33 +90,30 @@ async def new_config(req: NewProfileRequest):
 @router.get("/api/config/{profile_name}")
 async def get_profile_data(profile_name: str):
     """Gets the data for a specific profile."""
-    profiles = config_manager.get_all_profiles()
-    profile_data = profiles.get(profile_name)
-    if not profile_data:
+    await config_manager.ensure_loaded()
+    # Serialized once per profile change, then served as raw bytes
+    profile_json = config_manager.get_profile_json(profile_name)
+    if profile_json is None:
         raise HTTPException(status_code=404, detail=f"Profile '{profile_name}' not found.")
-    return profile_data
-
-class ActivateProfileRequest(BaseModel):
-    profile_name: str
+    return Response(content=profile_json, media_type="application/json")
 
 @router.post("/api/config/activate")
-async def activate_config(req: ActivateProfileRequest):
+async def activate_config(request: Request):
     """Activates a configuration profile."""
+    req = await _parse_body(request, ProfileNameRequest)
     try:
-        config_manager.activate_profile(req.profile_name)
+        await asyncio.to_thread(config_manager.activate_profile, req.profile_name)
         # Redirect to the root to show the updated config
         return RedirectResponse("/", status_code=303)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-class DeleteProfileRequest(BaseModel):
-    profile_name: str
-
 @router.post("/api/config/delete")
-async def delete_config(req: DeleteProfileRequest):
+async def delete_config(request: Request):
     """Deletes a configuration profile."""
+    req = await _parse_body(request, ProfileNameRequest)
     try:
-        config_manager.delete_profile(req.profile_name)
+        await asyncio.to_thread(config_manager.delete_profile, req.profile_name)
         return {"status": "success", "message": f"Profile '{req.profile_name}' deleted."}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file